@@ -1,23 +1,28 @@
+import functools
+import io
 import os
 import random
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from tempfile import NamedTemporaryFile
 
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import openai
 from PIL import Image, UnidentifiedImageError
 from streamlit_mic_recorder import mic_recorder
-from PIL import Image
 
 # ----------------------------
 # Config
 # ----------------------------
 APP_DIR = Path(__file__).resolve().parent
 IMAGE_DIR = APP_DIR / "image"
+AVATAR_PATH = str(IMAGE_DIR / "avatar.png")
+AVATAR_WIDTH = 72  # display width in px; increase/decrease as desired
 ROUNDS = 3
+PROMPTS = ("What else can this be?", "Great job! What else can this be?")  # round 1, later rounds
 
-openai.api_key = st.secrets.get("OPENAI_API_KEY", None) or os.environ.get("OPENAI_API_KEY", None)
-if not openai.api_key:
+OPENAI_API_KEY = st.secrets.get("OPENAI_API_KEY", None) or os.environ.get("OPENAI_API_KEY", None)
+if not OPENAI_API_KEY:
     st.error("Missing OPENAI_API_KEY (set it in .streamlit/secrets.toml or env var).")
     st.stop()
 
@@ -25,64 +30,105 @@ if not openai.api_key:
 # Image loading + validation
 # ----------------------------
 def list_candidate_images(image_dir: Path):
-    return sorted(list(image_dir.glob("*.png")) + list(image_dir.glob("*.PNG")))
-
-def is_valid_image(path: Path) -> bool:
+    # Single directory pass; matches .png case-insensitively (covers .png and .PNG).
+    with os.scandir(image_dir) as it:
+        return sorted(
+            Path(e.path)
+            for e in it
+            if e.is_file(follow_symlinks=False) and e.name.lower().endswith(".png")
+        )
+
+def is_valid_image(path: str | Path) -> bool:
     try:
+        # Header parse only; PIL loads pixel data lazily, so no decode/CRC scan.
         with Image.open(path) as im:
-            im.verify()
+            _ = im.size
         return True
     except (UnidentifiedImageError, OSError):
         return False
 
+@st.cache_data(show_spinner=False)
+def load_candidate_images(image_dir_str: str) -> tuple[str, ...]:
+    # Scanned once per process instead of on every rerun.
+    return tuple(str(p) for p in list_candidate_images(Path(image_dir_str)))
+
+@st.cache_data(show_spinner=False)
+def load_valid_images(candidates: tuple[str, ...]) -> tuple[str, ...]:
+    with ThreadPoolExecutor(max_workers=min(32, len(candidates))) as ex:
+        flags = list(ex.map(is_valid_image, candidates))
+    return tuple(p for p, ok in zip(candidates, flags) if ok)
+
 if not IMAGE_DIR.exists():
     st.error(f"Image folder not found: {IMAGE_DIR}")
     st.stop()
 
-candidates = list_candidate_images(IMAGE_DIR)
-valid_images = [p for p in candidates if is_valid_image(p)]
+candidates = load_candidate_images(str(IMAGE_DIR))
 
 if len(candidates) == 0:
     st.error(f"No .png images found in: {IMAGE_DIR}")
     st.stop()
 
-if len(valid_images) == 0:
-    st.error("Found .png files, but none could be opened as images.")
-    st.write("Files found:")
-    st.code("\n".join(str(p.name) for p in candidates))
-    st.stop()
-
-def pick_random_image() -> Path:
-    return random.choice(valid_images)
+# cache_resource: bytes are immutable, so hits share one object instead of unpickling a copy.
+@st.cache_resource(show_spinner=False)
+def load_image_bytes(path: str) -> bytes:
+    return Path(path).read_bytes()
+
+def pick_random_image(exclude: str | None = None, tries: int = 5) -> str:
+    # Only the picked image is validated; the full pass runs only if random picks keep failing.
+    for _ in range(tries):
+        path = random.choice(candidates)
+        if path != exclude and is_valid_image(path):
+            return path
+
+    valid_images = load_valid_images(candidates)
+    if len(valid_images) == 0:
+        st.error("Found .png files, but none could be opened as images.")
+        st.write("Files found:")
+        st.code("\n".join(Path(p).name for p in candidates))
+        st.stop()
+    others = [p for p in valid_images if p != exclude]
+    return random.choice(others or valid_images)
+
+@st.cache_resource
+def get_avatar() -> Image.Image:
+    img = Image.open(AVATAR_PATH).convert("RGBA")
+    # Downscale once to the display width: st.image passes an image that already fits
+    # through as-is, instead of resizing and PNG-encoding the full-size avatar on each rerun.
+    img.thumbnail((AVATAR_WIDTH, AVATAR_WIDTH), Image.Resampling.LANCZOS)
+    return img
 
 # ----------------------------
 # Helpers
 # ----------------------------
-def speak_text(text: str):
+@functools.lru_cache(maxsize=16)
+def _speak_html(text: str) -> str:
     safe = text.replace("\\", "\\\\").replace("'", "\\'")
-    st.components.v1.html(
-        f"""
+    return f"""
         <script>
           const utterance = new SpeechSynthesisUtterance('{safe}');
           window.speechSynthesis.cancel();
           window.speechSynthesis.speak(utterance);
         </script>
-        """,
-        height=0,
-    )
+        """
+
+def speak_text(text: str):
+    st.components.v1.html(_speak_html(text), height=0)
+
+@st.cache_resource
+def get_openai_client() -> openai.OpenAI:
+    # Shared across reruns and sessions so the HTTP connection pool is reused.
+    return openai.OpenAI(api_key=OPENAI_API_KEY)
+
+def wav_file(wav_bytes: bytes) -> io.BytesIO:
+    buf = io.BytesIO(wav_bytes)
+    buf.name = "audio.wav"  # the SDK infers the upload format from the name
+    return buf
 
 def transcribe_wav_bytes(wav_bytes: bytes) -> str:
-    with NamedTemporaryFile(suffix=".wav", delete=True) as tmp:
-        tmp.write(wav_bytes)
-        tmp.flush()
-        with open(tmp.name, "rb") as f:
-            result = openai.Audio.transcribe("whisper-1", f)
-    return result.get("text", "") if isinstance(result, dict) else ""
-
-def get_prompt_text(round_num: int) -> str:
-    if round_num == 1:
-        return "What else can this be?"
-    return "Great job! What else can this be?"
+    result = get_openai_client().audio.transcriptions.create(
+        model="whisper-1", file=wav_file(wav_bytes)
+    )
+    return result.text or ""
 
 # ----------------------------
 # Session state
@@ -90,17 +136,21 @@ def get_prompt_text(round_num: int) -> str:
 if "round" not in st.session_state:
     st.session_state.round = 1
 if "responses" not in st.session_state:
-    st.session_state.responses = []
+    st.session_state.responses = []  # transcript per round; index = round - 1
 if "spoken_round" not in st.session_state:
     st.session_state.spoken_round = 0
 if "last_transcript" not in st.session_state:
     st.session_state.last_transcript = None  # {"round": int, "text": str} | None
 
-# This controls the image for THIS user session.
+# This controls the image for THIS user session. The path (not an index into the
+# cached candidates) is stored so a cache clear can't swap the prop mid-game.
 if "selected_image_path" not in st.session_state:
-    st.session_state.selected_image_path = str(pick_random_image())
+    st.session_state.selected_image_path = pick_random_image()
 
-SELECTED_IMAGE_PATH = Path(st.session_state.selected_image_path)
+# Prop for the next Start Over (never the current one), chosen up front so the
+# browser can preload it during the game.
+if "next_image_path" not in st.session_state:
+    st.session_state.next_image_path = pick_random_image(exclude=st.session_state.selected_image_path)
 
 # ----------------------------
 # UI
@@ -114,84 +164,109 @@ st.write(
     "You’ll play for 3 rounds, then you can start over with a new random prop."
 )
 
-st.image(str(SELECTED_IMAGE_PATH), width="stretch")
+st.image(load_image_bytes(st.session_state.selected_image_path), width="stretch")
 
 # End screen (combined result)
 if st.session_state.round > ROUNDS:
     st.subheader("Your Responses (All Rounds)")
-    for item in st.session_state.responses:
-        st.write(f"**Round {item['round']}:** {item['response']}")
+    for i, text in enumerate(st.session_state.responses, start=1):
+        st.write(f"**Round {i}:** {text}")
 
     if st.button("Start Over"):
         st.session_state.round = 1
         st.session_state.responses = []
         st.session_state.spoken_round = 0
         st.session_state.last_transcript = None
-        st.session_state.selected_image_path = str(pick_random_image())
+        st.session_state.selected_image_path = st.session_state.next_image_path
+        st.session_state.next_image_path = pick_random_image(exclude=st.session_state.selected_image_path)
         st.rerun()
 
     st.stop()
 
 # Round UI
-prompt_text = get_prompt_text(st.session_state.round)
-
-st.subheader(f"Round {st.session_state.round} of {ROUNDS}")
-
-AVATAR_IMAGE = Image.open(IMAGE_DIR / "avatar.png")
-
-col_avatar, col_text = st.columns([1, 15], vertical_alignment="center")
-with col_avatar:
-    st.image(AVATAR_IMAGE, width=72)  # increase/decrease width as desired
-with col_text:
-    st.markdown(f"**{prompt_text}**")
-
-if st.session_state.spoken_round != st.session_state.round:
-    speak_text(prompt_text)
-    st.session_state.spoken_round = st.session_state.round
-
-st.write("Click Record to record your response then click Stop to submit for transcription:")
-
-audio = mic_recorder(
-    start_prompt="Record",
-    stop_prompt="Stop",
-    just_once=True,
-    key=f"mic_round_{st.session_state.round}",
-)
-
-st.write(
-    "**Note**: The prop image stays the same during your 3 rounds. "
-    "It may change when you click **Start Over** after 3 rounds or when the app/server is restarted."
+# Render the next Start Over prop off-screen so the browser already has its
+# content-hashed media URL cached when it becomes the selected image.
+st.html(
+    "<style>.st-key-next_prop_preload "
+    "{ position: absolute; width: 1px; height: 1px; overflow: hidden; opacity: 0; pointer-events: none; }"
+    "</style>"
 )
+with st.container(key="next_prop_preload"):
+    st.image(load_image_bytes(st.session_state.next_image_path), width="stretch")
+
+# Mic recorder ticks and round advances rerun only this fragment, not the whole
+# script (title, prop image, etc.).
+@st.fragment
+def mic_and_transcribe():
+    prompt_text = PROMPTS[0 if st.session_state.round == 1 else 1]
+
+    st.subheader(f"Round {st.session_state.round} of {ROUNDS}")
+
+    col_avatar, col_text = st.columns([1, 15], vertical_alignment="center")
+    with col_avatar:
+        st.image(get_avatar(), width=AVATAR_WIDTH)
+    with col_text:
+        st.markdown(f"**{prompt_text}**")
+
+    if st.session_state.spoken_round != st.session_state.round:
+        speak_text(prompt_text)
+        st.session_state.spoken_round = st.session_state.round
+
+    st.write("Click Record to record your response then click Stop to submit for transcription:")
+
+    audio = mic_recorder(
+        start_prompt="Record",
+        stop_prompt="Stop",
+        just_once=True,
+        key=f"mic_round_{st.session_state.round}",
+    )
 
-# Show the per-round result area DURING the game (persists via session_state)
-st.divider()
-st.subheader("Results")
-
-if st.session_state.last_transcript is not None:
-    st.success(
-        f"Round {st.session_state.last_transcript['round']} transcribed: "
-        f"{st.session_state.last_transcript['text']}"
+    st.write(
+        "**Note**: The prop image stays the same during your 3 rounds. "
+        "It may change when you click **Start Over** after 3 rounds or when the app/server is restarted."
     )
 
-if st.session_state.responses:
-    for item in st.session_state.responses:
-        st.write(f"**Round {item['round']}:** {item['response']}")
-else:
-    st.write("No responses yet - record your first answer.")
+    # Show the per-round result area DURING the game (persists via session_state)
+    st.divider()
+    st.subheader("Results")
+
+    if st.session_state.last_transcript is not None:
+        st.success(
+            f"Round {st.session_state.last_transcript['round']} transcribed: "
+            f"{st.session_state.last_transcript['text']}"
+        )
+
+    if st.session_state.responses:
+        for i, text in enumerate(st.session_state.responses, start=1):
+            st.write(f"**Round {i}:** {text}")
+    else:
+        st.write("No responses yet - record your first answer.")
+
+    # When audio arrives, transcribe and store result, then rerun (so it shows in Results so far).
+    # Only the last round needs a full rerun, to reach the end screen.
+    if audio and isinstance(audio, dict) and audio.get("bytes"):
+        st.info("Transcribing...")
+        try:
+            text = transcribe_wav_bytes(audio["bytes"]).strip()
+        except Exception as e:
+            st.error(f"Transcription error: {e}")
+            return
 
-# When audio arrives, transcribe and store result, then rerun (so it shows in Results so far)
-if audio and isinstance(audio, dict) and audio.get("bytes"):
-    st.info("Transcribing...")
-    try:
-        text = transcribe_wav_bytes(audio["bytes"]).strip()
         if not text:
             st.error("Transcription was empty—try again with a clearer recording.")
-        else:
-            # store so it shows immediately on the next rerun
-            st.session_state.last_transcript = {"round": st.session_state.round, "text": text}
+            return
 
-            st.session_state.responses.append({"round": st.session_state.round, "response": text})
-            st.session_state.round += 1
+        # store so it shows immediately on the next rerun
+        st.session_state.last_transcript = {"round": st.session_state.round, "text": text}
+
+        st.session_state.responses.append(text)
+        st.session_state.round += 1
+        if st.session_state.round > ROUNDS:
+            st.rerun()
+        try:
+            st.rerun(scope="fragment")
+        except StreamlitAPIException:
+            # Rejected when this fragment ran as part of a full-script run.
             st.rerun()
-    except Exception as e:
-        st.error(f"Transcription error: {e}")
\ No newline at end of file
+
+mic_and_transcribe()